@@ -12,6 +12,11 @@ GEN_MODEL = "llama3.2:latest"
 # Target file
 DATASET_PATH = Path("dataset.jsonl")
 
+# Poems requested per Ollama call (1 = one call per poem, the old behaviour)
+BATCH_SIZE = 5
+# How many times failed slots of a batch are re-requested before giving up
+BATCH_RETRIES = 2
+
 # Languages as in your UI
 LANGUAGES = [
     "English",
@@ -182,8 +187,9 @@ WORD_BANK = {
 
 
 def call_ollama(model_name: str, prompt: str, num_predict: int = 180,
-                temperature: float = 0.9, top_p: float = 0.95) -> str:
-    """Call Ollama API to generate text."""
+                temperature: float = 0.9, top_p: float = 0.95,
+                format: dict | None = None) -> str:
+    """Call Ollama API to generate text (optionally constrained to a JSON schema)."""
     options = {
         "temperature": float(temperature),
         "top_p": float(top_p),
@@ -195,6 +201,8 @@ def call_ollama(model_name: str, prompt: str, num_predict: int = 180,
         "stream": False,
         "options": options,
     }
+    if format is not None:
+        payload["format"] = format
     resp = requests.post(OLLAMA_URL, json=payload, timeout=120)
     resp.raise_for_status()
     data = resp.json()
@@ -267,6 +275,62 @@ Write a poem in the specified language that follows the given poetic form and mo
     return instruction
 
 
+def build_batch_instruction(language: str, form: str, mood: str, word_sets) -> str:
+    """Build one prompt asking for a JSON array with one poem per word set."""
+    fi = form_instructions(form)
+    li = lang_instruction(language)
+    mp = mood_phrase(mood)
+    numbered = "\n".join(f"{i}. {', '.join(words)}" for i, words in enumerate(word_sets, 1))
+
+    instruction = f"""You are a skilled poet.
+
+Language: {language}
+Poetic form: {form}
+Mood: {mood}
+Word sets:
+{numbered}
+
+Task:
+Write {len(word_sets)} separate poems, one for each numbered word set, in the same order.
+Every poem must follow the given language, poetic form and mood.
+- {fi}
+- Each poem must naturally use ALL of the words from its own word set.
+- The tone should clearly feel {mp}.
+- {li}
+- Answer with JSON only: {{"poems": [...]}} containing exactly {len(word_sets)} poem strings.
+  Separate the lines of a poem with \\n. Do NOT explain anything."""
+    return instruction
+
+
+def batch_schema(k: int) -> dict:
+    """JSON schema passed to Ollama's `format` so the reply is an array of k poems."""
+    return {
+        "type": "object",
+        "properties": {
+            "poems": {
+                "type": "array",
+                "items": {"type": "string"},
+                "minItems": k,
+                "maxItems": k,
+            },
+        },
+        "required": ["poems"],
+    }
+
+
+def token_budget(form: str) -> int:
+    """Choose token budget for one poem based on form."""
+    if form == "Haiku-like (3 lines)":
+        return 40
+    elif form == "Quatrain (4 lines)":
+        return 80
+    elif form == "Couplets (2–4 rhymed lines)":
+        return 100
+    elif form == "Sonnet (14 lines)":
+        return 180
+    return 120  # Free form
+
+
 def enforce_lines(poem: str, form: str) -> str:
     """Enforce line count based on poetic form."""
     lines = [l for l in poem.splitlines() if l.strip()]
@@ -293,6 +357,121 @@ def missing_words(poem: str, words) -> list[str]:
     return missing
 
 
+def form_matches(poem: str, form: str) -> bool:
+    """Check that an (already enforced) poem has the line count its form asks for."""
+    n = len([l for l in poem.splitlines() if l.strip()])
+    if form == "Haiku-like (3 lines)":
+        return n == 3
+    elif form == "Quatrain (4 lines)":
+        return n == 4
+    elif form == "Couplets (2–4 rhymed lines)":
+        return 2 <= n <= 4
+    elif form == "Sonnet (14 lines)":
+        return n == 14
+    elif form == "Free form (up to 10 lines)":
+        return 1 <= n <= 10
+    return n > 0
+
+
+def request_poems(language: str, form: str, mood: str, sets) -> list:
+    """
+    Ask for one poem per word set in a single request.
+    Raises ValueError if a batch reply is not the expected JSON (e.g. cut off by num_predict).
+    """
+    if len(sets) == 1:
+        return [call_ollama(
+            model_name=GEN_MODEL,
+            prompt=build_instruction(language, form, mood, sets[0]),
+            num_predict=token_budget(form),
+            temperature=0.8,
+            top_p=0.9,
+        )]
+
+    raw = call_ollama(
+        model_name=GEN_MODEL,
+        prompt=build_batch_instruction(language, form, mood, sets),
+        # Per-poem budget plus a little room for JSON quoting
+        num_predict=len(sets) * (token_budget(form) + 20),
+        temperature=0.8,
+        top_p=0.9,
+        format=batch_schema(len(sets)),
+    )
+    try:
+        poems = json.loads(raw)["poems"]
+    except (json.JSONDecodeError, KeyError, TypeError) as e:
+        raise ValueError(f"unparseable batch reply: {e}") from e
+    if not isinstance(poems, list):
+        raise ValueError("unparseable batch reply: 'poems' is not a list")
+    return poems
+
+
+def generate_batch(language: str, form: str, mood: str, word_sets) -> list[str | None]:
+    """
+    Generate one poem per word set, K at a time in a single request.
+    Every poem is validated on its own; only the failed slots are re-requested.
+    If a batch reply cannot be parsed, the remaining slots are requested in
+    halved batches (down to one poem per request).
+    Returns the accepted poem for each slot, or None if it never passed.
+    """
+    results: list[str | None] = [None] * len(word_sets)
+    todo = list(range(len(word_sets)))
+    k = len(word_sets)
+
+    for attempt in range(BATCH_RETRIES + 1):
+        if not todo:
+            break
+        if attempt:
+            print(f"↻  Re-requesting {len(todo)} failed slot(s) for {language}, {form}, {mood} "
+                  f"({k} per request)")
+
+        failed = []
+        # Advance by the current k, which can shrink partway through this pass
+        pos = 0
+        while pos < len(todo):
+            chunk = todo[pos:pos + k]
+            pos += len(chunk)
+            try:
+                poems = request_poems(language, form, mood, [word_sets[i] for i in chunk])
+            except ValueError as e:
+                print(f"❌ {e} for {language}, {form}, {mood}")
+                failed.extend(chunk)
+                # Probably ran out of tokens: smaller batches from now on
+                k = max(1, k // 2)
+                continue
+            except Exception as e:
+                print(f"❌ Error generating for {language}, {form}, {mood}: {e}")
+                failed.extend(chunk)
+                continue
+
+            for j, slot in enumerate(chunk):
+                poem = poems[j].strip() if j < len(poems) and isinstance(poems[j], str) else ""
+                if not poem:
+                    print(f"⚠️  Empty poem for {language}, {form}, {mood}, slot {slot+1}.")
+                    failed.append(slot)
+                    continue
+
+                # Enforce form lines
+                poem = enforce_lines(poem, form)
+
+                # JSON replies often put a whole poem on one line
+                if not form_matches(poem, form):
+                    print(f"⚠️  Wrong line count for {language}, {form}, {mood}, slot {slot+1}.")
+                    failed.append(slot)
+                    continue
+
+                # Skip if too many words missing
+                miss = missing_words(poem, word_sets[slot])
+                if len(miss) > 1:
+                    print(f"⚠️  Too many missing words ({miss}) for {language}, {form}, {mood}, slot {slot+1}.")
+                    failed.append(slot)
+                    continue
+
+                results[slot] = poem
+        todo = sorted(failed)
+
+    return results
+
+
 def main():
     """Generate synthetic poetry dataset."""
     # 10 samples per combination: 5 languages × 5 forms × 3 moods = 75 combos × 10 = 750
@@ -300,6 +479,7 @@ def main():
 
     print("Starting automatic dataset generation...")
     print(f"Target: 750 samples (10 per Language×Form×Mood combination)")
+    print(f"Batch size: {BATCH_SIZE} poems per request")
     print(f"Vocabulary: {len(WORD_BANK['English'])} English, "
           f"{len(WORD_BANK['Deutsch (German)'])} German, "
           f"{len(WORD_BANK['Hindi'])} Hindi, "
@@ -315,56 +495,24 @@ def main():
             
             for form in POETIC_FORMS:
                 for mood in MOODS:
-                    for i in range(samples_per_combo):
-                        # Choose 3 distinct words from expanded vocabulary
-                        words = random.sample(bank, 3)
-                        instruction = build_instruction(language, form, mood, words)
-
-                        # Choose token budget based on form
-                        if form == "Haiku-like (3 lines)":
-                            num_predict = 40
-                        elif form == "Quatrain (4 lines)":
-                            num_predict = 80
-                        elif form == "Couplets (2–4 rhymed lines)":
-                            num_predict = 100
-                        elif form == "Sonnet (14 lines)":
-                            num_predict = 180
-                        else:
-                            num_predict = 120  # Free form
-
-                        try:
-                            poem = call_ollama(
-                                model_name=GEN_MODEL,
-                                prompt=instruction,
-                                num_predict=num_predict,
-                                temperature=0.8,
-                                top_p=0.9,
-                            )
-                        except Exception as e:
-                            print(f"❌ Error generating for {language}, {form}, {mood}: {e}")
-                            continue
-
-                        poem = poem.strip()
-                        if not poem:
-                            print(f"⚠️  Empty poem for {language}, {form}, {mood}, skipping.")
-                            continue
-
-                        # Enforce form lines
-                        poem = enforce_lines(poem, form)
-
-                        # Optional: skip if too many words missing
-                        miss = missing_words(poem, words)
-                        if len(miss) > 1:
-                            print(f"⚠️  Too many missing words ({miss}) for {language}, {form}, {mood}, retrying...")
-                            continue
-
-                        example = {
-                            "instruction": instruction,
-                            "output": poem,
-                        }
-                        f.write(json.dumps(example, ensure_ascii=False) + "\n")
-
-                        print(f"✓ Saved: {language} | {form} | {mood} | Sample {i+1}/{samples_per_combo}")
+                    # Choose 3 distinct words from expanded vocabulary for every sample
+                    word_sets = [random.sample(bank, 3) for _ in range(samples_per_combo)]
+
+                    for start in range(0, samples_per_combo, BATCH_SIZE):
+                        batch = word_sets[start:start + BATCH_SIZE]
+                        poems = generate_batch(language, form, mood, batch)
+
+                        for i, (words, poem) in enumerate(zip(batch, poems), start):
+                            if poem is None:
+                                continue
+                            # Each sample keeps its own single-poem instruction
+                            example = {
+                                "instruction": build_instruction(language, form, mood, words),
+                                "output": poem,
+                            }
+                            f.write(json.dumps(example, ensure_ascii=False) + "\n")
+
+                            print(f"✓ Saved: {language} | {form} | {mood} | Sample {i+1}/{samples_per_combo}")
 
     print("\n" + "="*60)
     print("✅ Finished generating dataset.jsonl")
@@ -0,0 +1,254 @@
+import json
+import mmap
+import os
+import random
+import tempfile
+from array import array
+from pathlib import Path
+
+# Default dataset produced by auto_build_dataset.py
+DATASET_PATH = Path("dataset.jsonl")
+
+# Sidecar files written next to the dataset
+INDEX_SUFFIX = ".idx"
+TOKENS_SUFFIX = ".tok"
+TOKENS_INDEX_SUFFIX = ".tokidx"
+
+# Index header: [source size in bytes, source mtime in ns, number of offsets]
+_HEADER_LEN = 3
+# Token index header: [source size, source mtime, number of bounds, number of tokens,
+# length of the tokenizer key in bytes]; the key itself follows the bounds
+_TOK_HEADER_LEN = 5
+
+
+# ---- OFFSET INDEX ----
+
+def _sidecar(path: Path, suffix: str) -> Path:
+    return path.with_name(path.name + suffix)
+
+
+def _source_stamp(path: Path) -> list[int]:
+    st = path.stat()
+    return [st.st_size, st.st_mtime_ns]
+
+
+def _atomic_write(path: Path, *parts):
+    """
+    Write arrays/bytes to a temp file and move it over `path` in one step, so readers
+    never see a half-written file and existing mmaps of the old file stay valid.
+    """
+    # Unique name per writer, so concurrent threads/processes never share a temp file
+    with tempfile.NamedTemporaryFile(dir=path.parent, prefix=path.name + ".",
+                                     suffix=".tmp", delete=False) as f:
+        tmp = Path(f.name)
+        try:
+            for part in parts:
+                f.write(part)
+        except BaseException:
+            f.close()
+            tmp.unlink(missing_ok=True)
+            raise
+    try:
+        os.replace(tmp, path)
+    finally:
+        tmp.unlink(missing_ok=True)
+
+
+def _read_array(path: Path, typecode: str) -> array | None:
+    """Read a whole sidecar as an array, or None if it is missing or not well-formed."""
+    data = array(typecode)
+    try:
+        with path.open("rb") as f:
+            data.frombytes(f.read())
+    except (OSError, ValueError):
+        return None
+    return data
+
+
+def _build_index(path: Path) -> tuple[list[int], array]:
+    # Stamp first and scan only up to the stamped size, so lines appended during
+    # the scan (e.g. by auto_build_dataset.py) make the index stale, not silently short
+    stamp = _source_stamp(path)
+    size = stamp[0]
+    offsets = array("Q")
+    with path.open("rb") as f:
+        pos = 0
+        for line in f:
+            if pos >= size:
+                break
+            if line[:size - pos].strip():
+                offsets.append(pos)
+            pos += len(line)
+
+    header = array("Q", stamp + [len(offsets)])
+    _atomic_write(_sidecar(path, INDEX_SUFFIX), header, offsets)
+    return stamp, offsets
+
+
+def _load_index(path: Path) -> tuple[list[int], array]:
+    index = _read_array(_sidecar(path, INDEX_SUFFIX), "Q")
+    if index is not None and len(index) >= _HEADER_LEN:
+        stamp = index[:2].tolist()
+        if stamp == _source_stamp(path) and len(index) == _HEADER_LEN + index[2]:
+            return stamp, index[_HEADER_LEN:]
+    return _build_index(path)
+
+
+def build_index(path: Path) -> array:
+    """Scan the JSONL once and write a sidecar file of line start offsets."""
+    return _build_index(Path(path))[1]
+
+
+def load_index(path: Path) -> array:
+    """Return line offsets from the sidecar index, rebuilding it if stale or missing."""
+    return _load_index(Path(path))[1]
+
+
+# ---- RANDOM ACCESS DATASET ----
+
+class JsonlDataset:
+    """Memory-mapped JSONL file with O(1) access to any record by position."""
+
+    def __init__(self, path: Path = DATASET_PATH):
+        self.path = Path(path)
+        # [size, mtime] the offsets describe; only that prefix of the file is mapped
+        self.stamp, self.offsets = _load_index(self.path)
+        self._file = self.path.open("rb")
+        # mmap refuses empty files
+        if self.stamp[0]:
+            self._mm = mmap.mmap(self._file.fileno(), self.stamp[0], access=mmap.ACCESS_READ)
+        else:
+            self._mm = None
+
+    def __len__(self) -> int:
+        return len(self.offsets)
+
+    def __getitem__(self, i: int) -> dict:
+        return json.loads(self.raw(i))
+
+    def raw(self, i: int) -> bytes:
+        """Return the undecoded bytes of record i."""
+        start = self.offsets[i]
+        end = self._mm.find(b"\n", start)
+        if end == -1:
+            end = len(self._mm)
+        return self._mm[start:end]
+
+    def iter_shuffled(self, seed: int | None = None):
+        """Yield every record once in a random order, decoding lazily."""
+        order = array("Q", range(len(self)))
+        random.Random(seed).shuffle(order)
+        for i in order:
+            yield self[i]
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def close(self):
+        if self._mm is not None:
+            self._mm.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# ---- TOKENIZED CACHE ----
+
+class TokenCache:
+    """
+    Tokenized instruction/output pairs stored as one flat uint32 array.
+    Record i occupies tokens[bounds[2*i]:bounds[2*i+1]] (instruction)
+    and tokens[bounds[2*i+1]:bounds[2*i+2]] (output).
+    The token file is memory-mapped, so loading costs nothing up front.
+    """
+
+    def __init__(self, tokens, bounds: array):
+        self.tokens = tokens
+        self.bounds = bounds
+
+    def __len__(self) -> int:
+        return (len(self.bounds) - 1) // 2
+
+    def __getitem__(self, i: int):
+        a, b, c = self.bounds[2 * i], self.bounds[2 * i + 1], self.bounds[2 * i + 2]
+        return self.tokens[a:b], self.tokens[b:c]
+
+    @classmethod
+    def build(cls, dataset: JsonlDataset, encode, key: str) -> "TokenCache":
+        """
+        Tokenize every record with encode(text) -> list[int] and write the cache files.
+        `key` identifies the tokenizer (e.g. "gemma3:262144" for name and vocab size);
+        a cache built with a different key is never reused.
+        """
+        tokens = array("I")
+        bounds = array("Q", [0])
+        for example in dataset:
+            tokens.extend(encode(example["instruction"]))
+            bounds.append(len(tokens))
+            tokens.extend(encode(example["output"]))
+            bounds.append(len(tokens))
+
+        key_bytes = key.encode("utf-8")
+        header = array("Q", dataset.stamp + [len(bounds), len(tokens), len(key_bytes)])
+        _atomic_write(_sidecar(dataset.path, TOKENS_SUFFIX), tokens)
+        _atomic_write(_sidecar(dataset.path, TOKENS_INDEX_SUFFIX), header, bounds, key_bytes)
+        return cls(tokens, bounds)
+
+    @classmethod
+    def load(cls, path: Path, key: str) -> "TokenCache | None":
+        """Map an existing token cache, or return None if it is missing, stale or from another tokenizer."""
+        path = Path(path)
+        tok_path = _sidecar(path, TOKENS_SUFFIX)
+        try:
+            raw = _sidecar(path, TOKENS_INDEX_SUFFIX).read_bytes()
+            tok_size = os.path.getsize(tok_path)
+        except OSError:
+            return None
+
+        header_size = _TOK_HEADER_LEN * 8
+        if len(raw) < header_size:
+            return None
+        header = array("Q")
+        header.frombytes(raw[:header_size])
+        n_bounds, n_tokens, key_len = header[2:]
+        key_bytes = key.encode("utf-8")
+        if (header[:2].tolist() != _source_stamp(path)
+                or len(raw) != header_size + 8 * n_bounds + key_len
+                or raw[header_size + 8 * n_bounds:] != key_bytes
+                or tok_size != 4 * n_tokens):
+            return None
+        bounds = array("Q")
+        bounds.frombytes(raw[header_size:header_size + 8 * n_bounds])
+
+        if n_tokens == 0:
+            return cls(array("I"), bounds)
+        with tok_path.open("rb") as f:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return cls(memoryview(mm).cast("I"), bounds)
+
+    @classmethod
+    def load_or_build(cls, dataset: JsonlDataset, encode, key: str) -> "TokenCache":
+        cache = cls.load(dataset.path, key)
+        if cache is None or len(cache) != len(dataset):
+            cache = cls.build(dataset, encode, key)
+        return cache
+
+
+def main():
+    """Build (or refresh) the offset index for dataset.jsonl and print a sample."""
+    with JsonlDataset(DATASET_PATH) as ds:
+        print(f"Indexed {len(ds)} records from {DATASET_PATH}")
+        for example in ds.iter_shuffled(seed=0):
+            print(example["instruction"])
+            print("---")
+            print(example["output"])
+            break
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Listen where poem.py expects Ollama, so the app needs no changes
+HOST = "127.0.0.1"
+PORT = 11434
+
+# Latency model (seconds): prefill before the first token, then a fixed cost per token.
+# Every request's delays are scaled by a random factor in [1 - JITTER, 1 + JITTER].
+TTFT = 0.3
+TOKEN_DELAY = 0.02
+JITTER = 0.2
+
+# Per-request time to first token (seconds), served at GET /stats for load_test.py
+_ttfts: list[float] = []
+_stats_lock = threading.Lock()
+
+FILLER = ["soft", "light", "falls", "over", "the", "quiet", "water", "and", "slow", "night"]
+
+
+# ---- FAKE POEMS ----
+
+def line_count(prompt: str) -> int:
+    """Guess how many lines the prompt's poetic form asks for."""
+    m = re.search(r"exactly (\d+)|up to (\d+)|have (\d+) to", prompt)
+    if not m:
+        return 4
+    return int(next(g for g in m.groups() if g))
+
+
+def fake_poem(words, lines: int) -> str:
+    """A poem with the requested number of lines that uses every required word."""
+    out = []
+    for i in range(lines):
+        line = random.sample(FILLER, 3)
+        if i < len(words):
+            line.insert(1, words[i])
+        out.append(" ".join(line))
+    # Put any words left over on the last line
+    if len(words) > lines:
+        out[-1] += " " + " ".join(words[lines:])
+    return "\n".join(out)
+
+
+def fake_response(body: dict) -> str:
+    prompt = body.get("prompt", "")
+    lines = line_count(prompt)
+
+    # Batch prompt from auto_build_dataset.py: numbered word sets, JSON reply
+    if body.get("format") is not None:
+        sets = re.findall(r"^\d+\. (.*)$", prompt, re.M)
+        poems = [fake_poem(s.split(", "), lines) for s in sets]
+        return json.dumps({"poems": poems}, ensure_ascii=False)
+
+    # Translation prompt from poem.py: echo the words back
+    m = re.search(r"^Words: (.*)$", prompt, re.M)
+    words = m.group(1).split(", ") if m else []
+    if prompt.lstrip().startswith("Translate"):
+        return ", ".join(words)
+    return fake_poem(words, lines)
+
+
+def tokens(text: str) -> list[str]:
+    """Split text into word-ish chunks that keep their whitespace, like streamed tokens."""
+    return re.findall(r"\S+\s*|\s+", text)
+
+
+# ---- SERVER ----
+
+def _record_ttft(seconds: float):
+    with _stats_lock:
+        _ttfts.append(seconds)
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        if self.path != "/stats":
+            self.send_error(404)
+            return
+        with _stats_lock:
+            data = json.dumps({"requests": len(_ttfts), "ttft": list(_ttfts)}).encode()
+        self._send_json(data)
+
+    def do_POST(self):
+        if self.path == "/stats/reset":
+            with _stats_lock:
+                _ttfts.clear()
+            self._send_json(b"{}")
+            return
+        if self.path != "/api/generate":
+            self.send_error(404)
+            return
+        received = time.monotonic()
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        scale = random.uniform(1 - JITTER, 1 + JITTER)
+        chunks = tokens(fake_response(body))
+        num_predict = body.get("options", {}).get("num_predict")
+        if num_predict is not None:
+            chunks = chunks[:int(num_predict)]
+
+        try:
+            time.sleep(TTFT * scale)
+            if body.get("stream", True):
+                self.send_response(200)
+                self.send_header("Content-Type", "application/x-ndjson")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                for i, chunk in enumerate(chunks):
+                    self._write_chunk({"model": body.get("model"), "response": chunk, "done": False})
+                    if i == 0:
+                        _record_ttft(time.monotonic() - received)
+                    time.sleep(TOKEN_DELAY * scale)
+                self._write_chunk({"model": body.get("model"), "response": "", "done": True})
+                self.wfile.write(b"0\r\n\r\n")
+            else:
+                time.sleep(TOKEN_DELAY * scale * len(chunks))
+                data = json.dumps({"model": body.get("model"), "response": "".join(chunks),
+                                   "done": True}).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+                # Non-streaming: the first token arrives with the whole reply
+                _record_ttft(time.monotonic() - received)
+        except (BrokenPipeError, ConnectionResetError):
+            # Client cancelled (hedging / best-of-N); stop generating like Ollama does
+            pass
+
+    def _send_json(self, data: bytes):
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _write_chunk(self, obj: dict):
+        data = (json.dumps(obj, ensure_ascii=False) + "\n").encode()
+        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+
+    def log_message(self, *args):
+        pass
+
+
+def main():
+    """Serve a latency-configurable stand-in for Ollama's /api/generate."""
+    global TTFT, TOKEN_DELAY, JITTER
+
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--ttft", type=float, default=TTFT, help="seconds before the first token")
+    parser.add_argument("--token-delay", type=float, default=TOKEN_DELAY, help="seconds per token")
+    parser.add_argument("--jitter", type=float, default=JITTER, help="relative latency spread")
+    args = parser.parse_args()
+    TTFT, TOKEN_DELAY, JITTER = args.ttft, args.token_delay, args.jitter
+
+    server = ThreadingHTTPServer((args.host, args.port), Handler)
+    server.daemon_threads = True
+    print(f"Fake Ollama on http://{args.host}:{args.port}/api/generate "
+          f"(ttft={TTFT}s, token_delay={TOKEN_DELAY}s, jitter={JITTER})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
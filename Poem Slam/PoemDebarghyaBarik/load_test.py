@@ -0,0 +1,288 @@
+import argparse
+import json
+import math
+import random
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+
+from gradio_client import Client
+from gradio_client.utils import Status
+
+# ---- CONFIG ----
+
+# Running poem.py app (start fake_ollama.py first so no real model is needed)
+APP_URL = "http://127.0.0.1:7860/"
+API_NAME = "/generate_poem"
+
+# fake_ollama.py behind the app; it measures time to first token per model call
+OLLAMA_STATS_URL = "http://127.0.0.1:11434/stats"
+
+# Every run is saved here as JSON so capacity can be compared across changes
+RESULTS_DIR = Path("load_results")
+
+# Same choices as the UI in poem.py
+LANGUAGES = [
+    "English",
+    "Deutsch (German)",
+    "Hindi",
+    "Русский (Russian)",
+    "中文 (Chinese)",
+]
+
+POETIC_FORMS = [
+    "Haiku-like (3 lines)",
+    "Quatrain (4 lines)",
+    "Couplets (2–4 rhymed lines)",
+    "Sonnet (14 lines)",
+    "Free form (up to 10 lines)",
+]
+
+MOODS = [
+    "Romantic",
+    "Melancholic",
+    "Nature",
+]
+
+WORDS = [
+    "river", "leaf", "dawn", "shadow", "mountain", "forest", "ocean", "flame",
+    "dust", "breath", "sky", "stone", "storm", "valley", "meadow", "tide",
+]
+
+# Job states that mean the app has started running our handler
+_RUNNING = {Status.PROCESSING, Status.ITERATING, Status.PROGRESS}
+
+
+# ---- ONE REQUEST ----
+
+def random_params(args) -> dict:
+    """Pick one request from the configured parameter mix."""
+    return {
+        "words": random.sample(WORDS, 3),
+        "language": random.choice(args.language or LANGUAGES),
+        "form": random.choice(args.form or POETIC_FORMS),
+        "mood": random.choice(args.mood or MOODS),
+    }
+
+
+def run_one(client: Client, params: dict, scheduled: float, args) -> dict:
+    """
+    Submit one request and time it.
+    All times are measured from `scheduled` (the planned arrival), so requests
+    that had to wait for a free client slot are not reported as fast.
+    """
+    record = dict(params, ok=False, error=None)
+    started = time.monotonic()
+    job = client.submit(
+        *params["words"],
+        params["language"],
+        params["form"],
+        params["mood"],
+        args.temperature,
+        args.top_p,
+        args.candidates,
+        api_name=API_NAME,
+    )
+
+    running_at = None
+    while not job.done():
+        if running_at is None and job.status().code in _RUNNING:
+            running_at = time.monotonic()
+        time.sleep(args.poll)
+
+    try:
+        result = job.result()
+        record["ok"] = isinstance(result, str) and bool(result) and not result.startswith(
+            ("Error", "Could not connect", "The model did not answer", "Model returned")
+        )
+        if not record["ok"]:
+            record["error"] = result
+    except Exception as e:
+        record["error"] = repr(e)
+
+    finished = time.monotonic()
+    running_at = running_at or finished
+    record["client_wait"] = started - scheduled
+    record["queue_wait"] = running_at - scheduled
+    record["latency"] = finished - scheduled
+    return record
+
+
+# ---- LOAD GENERATION ----
+
+def run_load(args) -> tuple[list[dict], float]:
+    """
+    Open loop (Poisson arrivals at --rate req/s) if a rate is given,
+    otherwise closed loop with --concurrency users sending back to back.
+    At most --concurrency requests are in flight either way.
+    """
+    client = Client(args.url, verbose=False)
+    records = []
+    lock = threading.Lock()
+
+    def task(scheduled):
+        rec = run_one(client, random_params(args), scheduled, args)
+        with lock:
+            records.append(rec)
+            done = len(records)
+        if done % max(1, args.requests // 10) == 0:
+            print(f"  {done}/{args.requests} requests finished")
+
+    start = time.monotonic()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        if args.rate:
+            arrival = start
+            for _ in range(args.requests):
+                arrival += random.expovariate(args.rate)
+                time.sleep(max(0.0, arrival - time.monotonic()))
+                pool.submit(task, arrival)
+        else:
+            counter = iter(range(args.requests))
+            counter_lock = threading.Lock()
+
+            def user():
+                while True:
+                    with counter_lock:
+                        if next(counter, None) is None:
+                            return
+                    task(time.monotonic())
+
+            for _ in range(args.concurrency):
+                pool.submit(user)
+
+    return records, time.monotonic() - start
+
+
+# ---- BACKEND STATS ----
+
+def fetch_stats(url: str, reset: bool = False) -> dict | None:
+    """Read (or reset) fake_ollama.py's per-call stats; None if the backend has none."""
+    try:
+        if reset:
+            req = urllib.request.Request(url + "/reset", data=b"{}", method="POST")
+        else:
+            req = urllib.request.Request(url)
+        with urllib.request.urlopen(req, timeout=5) as resp:
+            return json.loads(resp.read())
+    except (OSError, ValueError):
+        return None
+
+
+# ---- REPORTING ----
+
+def percentile(values, p: float) -> float | None:
+    """Nearest-rank percentile (p in 0..100)."""
+    if not values:
+        return None
+    values = sorted(values)
+    idx = max(0, min(len(values) - 1, math.ceil(p / 100 * len(values)) - 1))
+    return values[idx]
+
+
+def summarize(records: list[dict], wall: float, stats: dict | None) -> dict:
+    ok = [r for r in records if r["ok"]]
+    summary = {
+        "requests": len(records),
+        "ok": len(ok),
+        "errors": len(records) - len(ok),
+        "wall_seconds": wall,
+        "throughput_rps": len(ok) / wall if wall else 0.0,
+    }
+    for key in ("queue_wait", "latency"):
+        values = [r[key] for r in ok]
+        summary[f"{key}_p50"] = percentile(values, 50)
+        summary[f"{key}_p99"] = percentile(values, 99)
+
+    # Time to first token of each model call (translation, candidates and
+    # hedges included), as measured by the backend stand-in
+    ttfts = stats["ttft"] if stats else []
+    summary["model_calls"] = stats["requests"] if stats else None
+    summary["ttft_p50"] = percentile(ttfts, 50)
+    summary["ttft_p99"] = percentile(ttfts, 99)
+    return summary
+
+
+def fmt(value) -> str:
+    if value is None:
+        return "-"
+    return f"{value:.3f}" if isinstance(value, float) else str(value)
+
+
+def print_summary(summary: dict, baseline: dict | None = None):
+    print(f"\n{'='*60}")
+    header = f"{'metric':<20}{'this run':>14}"
+    if baseline:
+        header += f"{'baseline':>14}{'change':>10}"
+    print(header)
+    print(f"{'-'*60}")
+    for key, value in summary.items():
+        line = f"{key:<20}{fmt(value):>14}"
+        if baseline:
+            old = baseline.get(key)
+            line += f"{fmt(old):>14}"
+            if isinstance(value, (int, float)) and isinstance(old, (int, float)) and old:
+                line += f"{(value - old) / old:>+10.1%}"
+        print(line)
+    print(f"{'='*60}")
+
+
+def main():
+    """Drive the running poem.py app with concurrent requests and report capacity."""
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument("--url", default=APP_URL, help="Gradio app URL")
+    parser.add_argument("--stats-url", default=OLLAMA_STATS_URL,
+                        help="fake_ollama.py stats endpoint (for time to first token)")
+    parser.add_argument("--requests", type=int, default=100, help="total requests to send")
+    parser.add_argument("--concurrency", type=int, default=8, help="max requests in flight")
+    parser.add_argument("--rate", type=float, default=0.0,
+                        help="arrival rate in req/s (Poisson); 0 = closed loop")
+    parser.add_argument("--language", action="append", choices=LANGUAGES,
+                        help="restrict the mix (repeatable)")
+    parser.add_argument("--form", action="append", choices=POETIC_FORMS,
+                        help="restrict the mix (repeatable)")
+    parser.add_argument("--mood", action="append", choices=MOODS,
+                        help="restrict the mix (repeatable)")
+    parser.add_argument("--temperature", type=float, default=0.9)
+    parser.add_argument("--top-p", type=float, default=0.95)
+    parser.add_argument("--candidates", type=int, default=1, help="best-of-N candidates")
+    parser.add_argument("--poll", type=float, default=0.02, help="job status poll interval (s)")
+    parser.add_argument("--label", help="name of the results file (default: timestamp)")
+    parser.add_argument("--compare", type=Path, help="earlier results file to compare against")
+    parser.add_argument("--seed", type=int, help="seed for the parameter mix and arrivals")
+    args = parser.parse_args()
+
+    if args.seed is not None:
+        random.seed(args.seed)
+
+    mode = f"open loop at {args.rate} req/s" if args.rate else "closed loop"
+    print(f"Load test against {args.url}: {args.requests} requests, "
+          f"concurrency {args.concurrency}, {mode}")
+
+    if fetch_stats(args.stats_url, reset=True) is None:
+        print(f"No stats at {args.stats_url}; time to first token will not be reported "
+              "(run the app against fake_ollama.py)")
+    records, wall = run_load(args)
+    summary = summarize(records, wall, fetch_stats(args.stats_url))
+
+    baseline = None
+    if args.compare:
+        baseline = json.loads(args.compare.read_text(encoding="utf-8"))["summary"]
+    print_summary(summary, baseline)
+
+    RESULTS_DIR.mkdir(exist_ok=True)
+    label = args.label or datetime.now().strftime("%Y%m%d-%H%M%S")
+    out = RESULTS_DIR / f"{label}.json"
+    config = {k: (str(v) if isinstance(v, Path) else v) for k, v in vars(args).items()}
+    out.write_text(
+        json.dumps({"config": config, "summary": summary, "records": records},
+                   ensure_ascii=False, indent=2),
+        encoding="utf-8",
+    )
+    print(f"Saved results to {out}")
+
+
+if __name__ == "__main__":
+    main()
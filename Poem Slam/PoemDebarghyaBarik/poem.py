@@ -1,4 +1,15 @@
+import json
+import random
+import socket
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, as_completed, wait
+from concurrent.futures import TimeoutError as FuturesTimeout
+
 import requests
+import urllib3
+from requests.adapters import HTTPAdapter
 import gradio as gr
 
 # ---- CONFIG ----
@@ -11,33 +22,299 @@ POETRY_MODEL = "llama3.2:latest"
 # You can use the same model for translation, or switch to qwen3:4b if you want
 TRANSLATION_MODEL = "llama3.2:latest"
 
+# Optional second Ollama server with the same models, used for hedged requests.
+# Set to e.g. "http://other-host:11434/api/generate"; None disables hedging.
+HEDGE_OLLAMA_URL = None
+
+# End-to-end time budget (seconds) for one button click: translation + poem
+REQUEST_DEADLINE = 60.0
+
+# A call that runs longer than this percentile of recent latencies gets hedged
+HEDGE_PERCENTILE = 0.95
+# No hedging until this many latencies have been observed for a token budget
+HEDGE_MIN_SAMPLES = 20
+# Floor for the hedge delay
+HEDGE_MIN_DELAY = 2.0
+
+# Upper bound for the "Candidates" slider (parallel best-of-N generation)
+MAX_CANDIDATES = 4
+
 
 # ---- HELPER FUNCTIONS ----
 
+class DeadlineExceeded(Exception):
+    """Raised when a request runs past its end-to-end deadline."""
+
+
+class CancelToken:
+    """
+    Cancellation flag for in-flight Ollama calls.
+    Setting it shuts down every socket those calls opened, so a call blocked
+    waiting on a stalled backend returns at once instead of at the deadline.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._set = False
+        self._sockets = []
+
+    def is_set(self) -> bool:
+        return self._set
+
+    def set(self):
+        with self._lock:
+            self._set = True
+            sockets, self._sockets = self._sockets, []
+        for sock in sockets:
+            _shutdown(sock)
+
+    def watch(self, sock: socket.socket):
+        with self._lock:
+            if not self._set:
+                self._sockets.append(sock)
+                return
+        _shutdown(sock)
+
+
+def _shutdown(sock: socket.socket):
+    try:
+        sock.shutdown(socket.SHUT_RDWR)
+    except OSError:
+        pass  # already closed
+
+
+# Cancel tokens of the call running on this thread; new sockets are handed to them
+_active = threading.local()
+
+
+class _WatchedHTTPConnection(urllib3.connection.HTTPConnection):
+    def _new_conn(self):
+        sock = super()._new_conn()
+        for token in getattr(_active, "cancels", ()):
+            token.watch(sock)
+        return sock
+
+
+class _WatchedHTTPSConnection(urllib3.connection.HTTPSConnection):
+    def _new_conn(self):
+        sock = super()._new_conn()
+        for token in getattr(_active, "cancels", ()):
+            token.watch(sock)
+        return sock
+
+
+class _WatchedHTTPConnectionPool(urllib3.HTTPConnectionPool):
+    ConnectionCls = _WatchedHTTPConnection
+
+
+class _WatchedHTTPSConnectionPool(urllib3.HTTPSConnectionPool):
+    ConnectionCls = _WatchedHTTPSConnection
+
+
+class _WatchedAdapter(HTTPAdapter):
+    """Transport adapter whose connections register their sockets with CancelTokens."""
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": _WatchedHTTPConnectionPool,
+            "https": _WatchedHTTPSConnectionPool,
+        }
+
+
+# Recent primary-backend latencies, keyed by (model, num_predict, purpose)
+_latencies: dict[tuple, deque] = {}
+_latencies_lock = threading.Lock()
+
+_executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix="ollama")
+# Separate pool for best-of-N candidates so they never wait on their own hedges
+_candidate_executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix="candidate")
+
+
+def _record_latency(key, seconds: float):
+    with _latencies_lock:
+        _latencies.setdefault(key, deque(maxlen=200)).append(seconds)
+
+
+def hedge_delay(key) -> float | None:
+    """
+    How long to wait on the primary backend before sending a hedged duplicate,
+    or None while there are too few samples to know what "slow" means.
+    `key` is (model, num_predict, purpose).
+    """
+    with _latencies_lock:
+        samples = sorted(_latencies.get(key, ()))
+    if len(samples) < HEDGE_MIN_SAMPLES:
+        return None
+    idx = min(int(len(samples) * HEDGE_PERCENTILE), len(samples) - 1)
+    return max(samples[idx], HEDGE_MIN_DELAY)
+
+
+def _stream_ollama(url: str, payload: dict, deadline: float, *cancels: CancelToken,
+                   record_key: tuple | None = None) -> str:
+    """
+    Run one streamed generation against a single backend.
+    Setting any of the cancel tokens closes the connection (which makes Ollama
+    stop generating) and the call returns an empty string.
+    With `record_key`, the call's latency feeds hedge_delay. Calls that time out or
+    are cancelled count too, with their elapsed time as a lower bound, so the
+    percentile is not biased toward the calls that happened to finish.
+    """
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+        raise DeadlineExceeded()
+
+    start = time.monotonic()
+    chunks = []
+    outcome = None  # "done", "cancelled" or "timeout"; errors are not samples
+    _active.cancels = cancels
+    try:
+        with requests.Session() as session:
+            session.mount("http://", _WatchedAdapter())
+            session.mount("https://", _WatchedAdapter())
+            with session.post(url, json=payload, stream=True,
+                              timeout=(min(5.0, remaining), remaining)) as response:
+                response.raise_for_status()
+                for line in response.iter_lines():
+                    if any(c.is_set() for c in cancels):
+                        break
+                    if time.monotonic() > deadline:
+                        raise DeadlineExceeded()
+                    if not line:
+                        continue
+                    data = json.loads(line)
+                    if "error" in data:
+                        raise RuntimeError(data["error"])
+                    chunks.append(data.get("response", ""))
+                    if data.get("done"):
+                        break
+        outcome = "done"
+    except requests.RequestException:
+        if any(c.is_set() for c in cancels):
+            outcome = "cancelled"
+            return ""
+        # Read timeouts (also surfaced as ConnectionError mid-stream) mean the budget ran out
+        if time.monotonic() >= deadline:
+            outcome = "timeout"
+            raise DeadlineExceeded()
+        raise
+    except DeadlineExceeded:
+        outcome = "timeout"
+        raise
+    finally:
+        _active.cancels = ()
+        if outcome != "timeout" and any(c.is_set() for c in cancels):
+            outcome = "cancelled"
+        if record_key is not None and outcome is not None:
+            _record_latency(record_key, time.monotonic() - start)
+
+    if outcome == "cancelled":
+        return ""
+    return "".join(chunks).strip()
+
+
+def _hedged_call(payload: dict, deadline: float, cancel: CancelToken, key: tuple) -> str:
+    """
+    Send the request to OLLAMA_URL; if it has not finished by the expected
+    latency percentile (or fails), send a duplicate to HEDGE_OLLAMA_URL.
+    The first backend to answer wins and the other one is cancelled.
+    Only the primary's latencies are recorded: a hedge started late and then
+    cancelled would otherwise add misleadingly short samples.
+    """
+    cancels = [CancelToken(), CancelToken()]
+    pending = {_executor.submit(_stream_ollama, OLLAMA_URL, payload, deadline,
+                                cancels[0], cancel, record_key=key)}
+    delay = hedge_delay(key)
+    # Without enough history only fail over on errors, never hedge a slow call
+    hedge_at = deadline if delay is None else time.monotonic() + delay
+    hedged = False
+    error = None
+
+    try:
+        while pending:
+            now = time.monotonic()
+            if now >= deadline:
+                raise DeadlineExceeded()
+            until = deadline if hedged else min(hedge_at, deadline)
+            done, pending = wait(pending, timeout=until - now, return_when=FIRST_COMPLETED)
+
+            for future in done:
+                try:
+                    return future.result()
+                except Exception as e:
+                    error = error or e
+
+            if not hedged and (done or time.monotonic() >= hedge_at):
+                hedged = True
+                pending.add(_executor.submit(
+                    _stream_ollama, HEDGE_OLLAMA_URL, payload, deadline, cancels[1], cancel
+                ))
+        raise error
+    finally:
+        for token in cancels:
+            token.set()
+
+
+def _bounded_call(payload: dict, deadline: float, cancel: CancelToken, key: tuple) -> str:
+    """
+    Unhedged call that returns by the deadline even if the backend stalls mid-stream.
+    The requests read timeout applies per read, so a stall after some progress could
+    otherwise block for a whole extra budget.
+    """
+    token = CancelToken()
+    future = _executor.submit(_stream_ollama, OLLAMA_URL, payload, deadline, token, cancel,
+                              record_key=key)
+    try:
+        done, _ = wait([future], timeout=max(deadline - time.monotonic(), 0))
+        if not done:
+            raise DeadlineExceeded()
+        return future.result()
+    finally:
+        token.set()
+
+
 def call_ollama(model_name: str, prompt: str, num_predict: int | None = None,
-                temperature: float = 0.9, top_p: float = 0.95) -> str:
-    """Call a local Ollama model and return the response text or raise an error."""
+                temperature: float = 0.9, top_p: float = 0.95,
+                deadline: float | None = None, seed: int | None = None,
+                cancel: CancelToken | None = None, hedge: bool = True,
+                purpose: str = "poem") -> str:
+    """
+    Call a local Ollama model and return the response text or raise an error.
+    `deadline` is a time.monotonic() timestamp shared by all calls of one request;
+    by default the call gets a fresh REQUEST_DEADLINE budget.
+    Setting `cancel` stops the generation early and makes the call return "".
+    `hedge=False` never sends a duplicate to HEDGE_OLLAMA_URL.
+    `purpose` separates latency statistics of calls that share a model and
+    token budget (e.g. 80-token translations and quatrains).
+    """
+    if deadline is None:
+        deadline = time.monotonic() + REQUEST_DEADLINE
+    if cancel is None:
+        cancel = CancelToken()
+
     options = {
         "temperature": float(temperature),
         "top_p": float(top_p),
     }
     if num_predict is not None:
         options["num_predict"] = int(num_predict)
+    if seed is not None:
+        options["seed"] = int(seed)
 
     payload = {
         "model": model_name,
         "prompt": prompt,
-        "stream": False,
+        "stream": True,
         "options": options,
     }
 
-    response = requests.post(OLLAMA_URL, json=payload, timeout=120)
-    response.raise_for_status()
-    data = response.json()
-    return data.get("response", "").strip()
+    key = (model_name, options.get("num_predict"), purpose)
+    if hedge and HEDGE_OLLAMA_URL:
+        return _hedged_call(payload, deadline, cancel, key)
+    return _bounded_call(payload, deadline, cancel, key)
 
 
-def translate_words_if_needed(words, language):
+def translate_words_if_needed(words, language, deadline: float | None = None):
     """
     Optionally translate the input words into the target language
     so the poem can stay monolingual.
@@ -76,6 +353,8 @@ Words: {words_str}
             num_predict=80,
             temperature=0.3,  # more deterministic for translation
             top_p=0.8,
+            deadline=deadline,
+            purpose="translation",
         )
         # Split back into a list
         translated_words = [w.strip() for w in translated_text.split(",") if w.strip()]
@@ -129,6 +408,27 @@ def missing_words(poem: str, words) -> list[str]:
     return missing
 
 
+def form_matches(poem: str, form: str) -> bool:
+    """Check that an (already enforced) poem has the line count its form asks for."""
+    n = len([line for line in poem.splitlines() if line.strip()])
+    if form == "Haiku-like (3 lines)":
+        return n == 3
+    elif form == "Quatrain (4 lines)":
+        return n == 4
+    elif form == "Couplets (2–4 rhymed lines)":
+        return 2 <= n <= 4
+    elif form == "Sonnet (14 lines)":
+        return n == 14
+    elif form == "Free form (up to 10 lines)":
+        return 1 <= n <= 10
+    return n > 0
+
+
+def score_poem(poem: str, form: str, words) -> tuple[int, int]:
+    """Lower is better: (missing word count, 1 if the form is wrong). (0, 0) fully passes."""
+    return len(missing_words(poem, words)), 0 if form_matches(poem, form) else 1
+
+
 # ---- PROMPT BUILDING ----
 
 def build_prompt(words, language, form, mood):
@@ -213,7 +513,64 @@ Write a poem in the specified language that follows the given poetic form and mo
 
 # ---- MAIN GENERATION FUNCTION ----
 
-def generate_poem(word1, word2, word3, language, form, mood, temperature, top_p):
+def best_of_n(prompt, form, words, n, max_tokens, temperature, top_p, deadline) -> str:
+    """
+    Generate n candidates in parallel with different seeds and return the best one.
+    Returns as soon as one candidate passes both checks and cancels the others.
+    Raises the first error only if no candidate produced a poem.
+    With n > 1 the candidates already race each other, so none of them is hedged
+    (otherwise one click could cost up to 2n backend calls).
+    """
+    cancel = CancelToken()
+    base_seed = random.randrange(2**31 - n)
+    futures = [
+        _candidate_executor.submit(
+            call_ollama,
+            model_name=POETRY_MODEL,
+            prompt=prompt,
+            num_predict=max_tokens,
+            temperature=temperature,
+            top_p=top_p,
+            deadline=deadline,
+            seed=base_seed + i,
+            cancel=cancel,
+            hedge=n == 1,
+        )
+        for i in range(n)
+    ]
+
+    best, best_score, error = "", None, None
+    try:
+        for future in as_completed(futures, timeout=max(deadline - time.monotonic(), 0)):
+            try:
+                poem = future.result()
+            except Exception as e:
+                error = error or e
+                continue
+            if not poem:
+                continue
+            poem = enforce_form_lines(poem, form)
+            score = score_poem(poem, form, words)
+            if best_score is None or score < best_score:
+                best, best_score = poem, score
+            if score == (0, 0):
+                break
+    except FuturesTimeout:
+        if not best:
+            raise DeadlineExceeded()
+    finally:
+        cancel.set()
+
+    if not best and error is not None:
+        raise error
+    return best
+
+
+def generate_poem(word1, word2, word3, language, form, mood, temperature, top_p,
+                  candidates=1):
+    # One deadline for the whole request, shared by translation and generation
+    deadline = time.monotonic() + REQUEST_DEADLINE
+
     # Clean and collect words
     cleaned = [clean_word(w) for w in [word1, word2, word3]]
     words = [w for w in cleaned if w]
@@ -222,7 +579,7 @@ def generate_poem(word1, word2, word3, language, form, mood, temperature, top_p)
         return "Please enter at least one non-empty word."
 
     # Translate words into target language if needed
-    translated_words = translate_words_if_needed(words, language)
+    translated_words = translate_words_if_needed(words, language, deadline)
 
     # Build prompt
     prompt = build_prompt(translated_words, language, form, mood)
@@ -244,13 +601,19 @@ def generate_poem(word1, word2, word3, language, form, mood, temperature, top_p)
         max_tokens = 80
 
     try:
-        poem = call_ollama(
-            model_name=POETRY_MODEL,
-            prompt=prompt,
-            num_predict=max_tokens,
+        poem = best_of_n(
+            prompt,
+            form,
+            translated_words,
+            n=max(1, min(int(candidates), MAX_CANDIDATES)),
+            max_tokens=max_tokens,
             temperature=temperature,
             top_p=top_p,
+            deadline=deadline,
         )
+    except DeadlineExceeded:
+        return (f"The model did not answer within {REQUEST_DEADLINE:.0f} seconds. "
+                "Please try again.")
     except requests.ConnectionError:
         return "Could not connect to Ollama. Please make sure the Ollama app is running."
     except Exception as e:
@@ -259,9 +622,6 @@ def generate_poem(word1, word2, word3, language, form, mood, temperature, top_p)
     if not poem:
         return "Model returned an empty response."
 
-    # Enforce line structure
-    poem = enforce_form_lines(poem, form)
-
     # Check if words are present
     missing = missing_words(poem, translated_words)
     if missing:
@@ -338,13 +698,21 @@ with gr.Blocks() as demo:
             label="Vocabulary richness (top_p)",
             info="Lower = simpler words, higher = richer vocabulary",
         )
+        candidates = gr.Slider(
+            minimum=1,
+            maximum=MAX_CANDIDATES,
+            value=1,
+            step=1,
+            label="Candidates (best-of-N)",
+            info="Generate several poems in parallel and keep the first that uses all words",
+        )
 
     generate_btn = gr.Button("Generate Poem")
     output = gr.Textbox(label="Poem", lines=16)
 
     generate_btn.click(
         fn=generate_poem,
-        inputs=[word1, word2, word3, language, form, mood, temperature, top_p],
+        inputs=[word1, word2, word3, language, form, mood, temperature, top_p, candidates],
         outputs=output,
     )
 